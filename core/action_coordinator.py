@@ -1,89 +1,130 @@
 import re
 import time
+from collections import Counter, deque
 from typing import Optional
 from .android_controller import AndroidController
 
+# Pre-compiled action patterns (hot path - executed on every agent step)
+_TAP_PATTERN = re.compile(r'TAP\s*\((\d+),\s*(\d+)\)')
+_TYPE_PATTERN = re.compile(r"TYPE\s*['\"]([^'\"]+)['\"]")
+
+# Single alternation classifies a line in one scan instead of four
+# independent pattern starts; dispatch happens on whichever group matched
+_ACTION_PATTERN = re.compile(
+    r"TAP\s*\((?P<tap_x>\d+),\s*(?P<tap_y>\d+)\)"
+    r"|(?P<type>TYPE\s*['\"])"
+    r"|(?P<scroll>(?i:scroll))"
+    r"|(?P<done>(?i:task_complete))"
+)
+
+
+def _classify_action_line(line: str):
+    """Return the highest-priority action match on a line
+
+    The leftmost alternation hit is not necessarily the right one ('scroll
+    area found, TAP (10,20)' must tap, not scroll), so keep scanning and
+    rank matches TAP > TYPE > SCROLL > TASK_COMPLETE like the original
+    cascade did. Single-action lines still finish in one match.
+    """
+    best_match = None
+    best_rank = 4
+    for candidate_match in _ACTION_PATTERN.finditer(line):
+        if candidate_match['tap_x'] is not None:
+            return candidate_match
+        if candidate_match['type'] is not None:
+            candidate_rank = 1
+        elif candidate_match['scroll'] is not None:
+            candidate_rank = 2
+        else:
+            candidate_rank = 3
+        if candidate_rank < best_rank:
+            best_match = candidate_match
+            best_rank = candidate_rank
+    return best_match
+
 
 class ActionCoordinator:
     """Coordinates action parsing and execution with loop prevention"""
     
     def __init__(self, android_controller: AndroidController):
         self.android_controller = android_controller
-        self.executed_actions_history = []
+        self.executed_actions_history = deque(maxlen=10)  # Ring buffer, O(1) append with eviction
         self.max_action_repetitions = 2
-    
+        # Sliding window of the last 4 actions with incremental counts,
+        # so the repetition test is an O(1) lookup rather than a scan
+        self._action_window = deque(maxlen=4)
+        self._action_counts = Counter()
+
+    def _record_action(self, coordinate_string: str):
+        """Add action to the sliding window, keeping counts in sync"""
+        if len(self._action_window) == self._action_window.maxlen:
+            evicted_action = self._action_window.popleft()
+            self._action_counts[evicted_action] -= 1
+            if self._action_counts[evicted_action] <= 0:
+                del self._action_counts[evicted_action]
+        self._action_window.append(coordinate_string)
+        self._action_counts[coordinate_string] += 1
+
     def is_action_repeating(self, action_command: str) -> bool:
         """Check if action is being repeated excessively"""
+        # Cheap substring gate keeps the regex engine out of non-TAP actions
+        if 'TAP' not in action_command:
+            return False
         # Extract coordinates for comparison
-        coordinate_pattern = re.search(r'TAP\s*\((\d+),\s*(\d+)\)', action_command)
+        coordinate_pattern = _TAP_PATTERN.search(action_command)
         if coordinate_pattern:
             coordinate_string = f"TAP({coordinate_pattern.group(1)},{coordinate_pattern.group(2)})"
-            recent_actions = self.executed_actions_history[-4:]  # Check last 4 actions
-            return recent_actions.count(coordinate_string) >= self.max_action_repetitions
+            return self._action_counts[coordinate_string] >= self.max_action_repetitions
         return False
     
     def execute_parsed_action(self, action_command: str) -> bool:
         """Parse and execute action with loop prevention"""
-        # Clean action text
+        # Extract primary action from multi-line responses with one
+        # classifying scan per line
         cleaned_action = action_command.strip()
-
-        # Extract primary action from multi-line responses
-        action_lines = cleaned_action.split('\n')
-        for line in action_lines:
-            line = line.strip()
-            if re.search(r'TAP\s*\(\d+,\s*\d+\)', line):
-                cleaned_action = line
-                break
-            elif re.search(r"TYPE\s*['\"]", line):
-                cleaned_action = line
-                break
-            elif 'SCROLL' in line.upper():
-                cleaned_action = line
-                break
-            elif 'TASK_COMPLETE' in line.upper():
-                cleaned_action = line
+        action_match = None
+        for line in cleaned_action.split('\n'):
+            line_match = _classify_action_line(line)
+            if line_match is not None:
+                cleaned_action = line.strip()
+                action_match = line_match
                 break
 
-        # Check for repetitive actions
-        coordinate_pattern = re.search(r'TAP\s*\((\d+),\s*(\d+)\)', cleaned_action)
-        if coordinate_pattern and self.is_action_repeating(cleaned_action):
-            print("Detected repetitive action, applying alternative strategy...")
-            # Use scroll as alternative
-            self.android_controller.perform_scroll_action('down')
+        if action_match is None:
             return False
 
-        # Track action for loop detection
-        if coordinate_pattern:
-            coordinate_string = f"TAP({coordinate_pattern.group(1)},{coordinate_pattern.group(2)})"
+        # Execute TAP actions (with repetition guard)
+        if action_match['tap_x'] is not None:
+            coordinate_string = f"TAP({action_match['tap_x']},{action_match['tap_y']})"
+            if self._action_counts[coordinate_string] >= self.max_action_repetitions:
+                print("Detected repetitive action, applying alternative strategy...")
+                # Use scroll as alternative
+                self.android_controller.perform_scroll_action('down')
+                return False
+            # Track action for loop detection (deque maxlen bounds the window)
             self.executed_actions_history.append(coordinate_string)
-            # Maintain sliding window of recent actions
-            self.executed_actions_history = self.executed_actions_history[-10:]
-
-        # Execute TAP actions
-        if coordinate_pattern:
-            x_coord, y_coord = int(coordinate_pattern.group(1)), int(coordinate_pattern.group(2))
-            self.android_controller.perform_tap_action(x_coord, y_coord)
+            self._record_action(coordinate_string)
+            self.android_controller.perform_tap_action(int(action_match['tap_x']), int(action_match['tap_y']))
             return False
 
-        # Execute TYPE actions
-        type_pattern = re.search(r"TYPE\s*['\"]([^'\"]+)['\"]", cleaned_action)
-        if type_pattern:
-            input_text = type_pattern.group(1)
-            self.android_controller.perform_text_input(input_text)
+        # Execute TYPE actions (full pattern extracts the quoted text)
+        if action_match['type'] is not None:
+            type_pattern = _TYPE_PATTERN.search(cleaned_action)
+            if type_pattern:
+                self.android_controller.perform_text_input(type_pattern.group(1))
             return False
 
         # Execute SCROLL actions
-        if 'SCROLL' in cleaned_action.upper():
-            scroll_direction = 'up' if 'up' in cleaned_action.lower() else 'down'
+        if action_match['scroll'] is not None:
+            scroll_direction = 'up' if 'up' in cleaned_action.casefold() else 'down'
             self.android_controller.perform_scroll_action(scroll_direction)
             return False
 
         # Handle task completion
-        if 'TASK_COMPLETE' in cleaned_action.upper():
-            return True
-
-        return False
+        return action_match['done'] is not None
     
     def reset_action_history(self):
         """Reset action history for new task"""
-        self.executed_actions_history = [] 
+        self.executed_actions_history.clear()
+        self._action_window.clear()
+        self._action_counts.clear() 
@@ -1,27 +1,38 @@
+import select
 import subprocess
 import time
 import os
-from typing import List, Optional
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+# Single-pass escape table for `input text` (replaces the chained .replace calls)
+_SHELL_ESCAPE_TABLE = str.maketrans({' ': '%s', '&': r'\&', '(': r'\(', ')': r'\)'})
 
 
 class AndroidController:
     """Manages Android device operations via ADB"""
-    
+
     def __init__(self, target_device_id: Optional[str] = None):
         self.target_device_id = target_device_id
+        self._shell_session = None
+        self._capture_executor = ThreadPoolExecutor(max_workers=2)
         self._establish_connection()
+        self._start_persistent_shell()
     
     def _establish_connection(self):
         """Establish connection to Android device via ADB"""
         try:
             cmd_result = subprocess.run(['adb', 'devices'], capture_output=True, text=True, check=True)
-            available_devices = [line.split()[0] for line in cmd_result.stdout.strip().split('\n')[1:]
-                               if line.strip() and 'device' in line]
+            first_device = next((line.split()[0] for line in cmd_result.stdout.splitlines()[1:]
+                               if line.strip() and 'device' in line), None)
 
-            if not available_devices:
+            if first_device is None:
                 raise Exception("No Android devices detected. Please connect your device and enable USB debugging.")
 
-            self.target_device_id = available_devices[0]
+            self.target_device_id = first_device
+            # Prefix reused by every adb invocation, built once per connection
+            self._adb_prefix = ('adb', '-s', self.target_device_id)
 
             # Verify UIAutomator functionality
             self._verify_uiautomator()
@@ -40,10 +51,76 @@ class AndroidController:
         except:
             print("UIAutomator verification failed")
 
+    def _start_persistent_shell(self):
+        """Open a long-lived adb shell session to avoid per-command process spawns"""
+        try:
+            self._shell_session = subprocess.Popen(self._adb_prefix + ('shell',),
+                                                 stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                                 stderr=subprocess.STDOUT, bufsize=0)
+        except Exception as e:
+            print(f"Persistent shell unavailable: {e}")
+            self._shell_session = None
+
+    def _discard_shell_session(self):
+        """Kill and drop the persistent session so the next call starts fresh"""
+        if self._shell_session is not None:
+            try:
+                self._shell_session.kill()
+            except Exception:
+                pass
+            self._shell_session = None
+
+    def _exec_shell(self, shell_command: str, timeout_seconds: int = 15) -> str:
+        """Execute command on the persistent shell session, falling back to one-shot adb"""
+        if self._shell_session is None or self._shell_session.poll() is not None:
+            self._start_persistent_shell()
+        if self._shell_session is None:
+            return self.run_adb_command(['shell', shell_command], timeout_seconds)
+
+        # Sentinel echo marks the command boundary in the shared stdout stream
+        completion_sentinel = f"__DONE_{uuid.uuid4().hex}__"
+        try:
+            self._shell_session.stdin.write(f"{shell_command}; echo {completion_sentinel}\n".encode())
+            self._shell_session.stdin.flush()
+        except Exception:
+            # Nothing reached the device yet, so a one-shot retry is safe
+            self._discard_shell_session()
+            return self.run_adb_command(['shell', shell_command], timeout_seconds)
+
+        try:
+            # The sentinel read is bounded by the same deadline run_adb_command
+            # enforces; a stalled device command must not hang the agent
+            read_deadline = time.monotonic() + timeout_seconds
+            output_lines = []
+            while True:
+                remaining_time = read_deadline - time.monotonic()
+                ready_streams, _, _ = select.select([self._shell_session.stdout], [], [],
+                                                  max(remaining_time, 0))
+                if not ready_streams:
+                    print(f"Persistent shell command timed out: {shell_command}")
+                    self._discard_shell_session()
+                    return ""
+                output_line = self._shell_session.stdout.readline()
+                if not output_line:
+                    raise Exception("persistent shell closed unexpectedly")
+                decoded_line = output_line.decode(errors='replace').rstrip('\r\n')
+                if completion_sentinel in decoded_line:
+                    break
+                output_lines.append(decoded_line)
+            return '\n'.join(output_lines).strip()
+
+        except Exception as e:
+            # The command was already written and may have run on the device;
+            # re-dispatching could execute non-idempotent input (taps,
+            # keystrokes) twice, so just drop the session and report nothing
+            print(f"Persistent shell read failed: {e}")
+            self._discard_shell_session()
+            return ""
+
     def run_adb_command(self, command_args: List[str], timeout_seconds: int = 15) -> str:
         """Execute ADB command and return output"""
         try:
-            complete_command = ['adb', '-s', self.target_device_id] + command_args
+            complete_command = self._adb_prefix + tuple(command_args)
             cmd_result = subprocess.run(complete_command, capture_output=True, text=True,
                                       check=True, timeout=timeout_seconds)
             return cmd_result.stdout.strip()
@@ -53,62 +130,62 @@ class AndroidController:
         except subprocess.CalledProcessError as e:
             return ""
 
-    def capture_device_screenshot(self, output_path: str) -> bool:
-        """Capture device screenshot with retry mechanism"""
-        capture_successful = False
+    def capture_screenshot_bytes(self) -> Optional[bytes]:
+        """Capture device screenshot as in-memory PNG bytes via exec-out"""
         for attempt_num in range(2):
             try:
-                # Clean up any existing files
-                self.run_adb_command(['shell', 'rm', '/sdcard/screenshot.png'])
-                time.sleep(0.5)
+                # Stream PNG directly from device, no /sdcard round-trip
+                capture_command = self._adb_prefix + ('exec-out', 'screencap', '-p')
+                capture_result = subprocess.run(capture_command, capture_output=True, timeout=10)
+                png_bytes = capture_result.stdout
+
+                # Verify payload integrity
+                if png_bytes and len(png_bytes) > 1000:
+                    return png_bytes
 
-                # Take screenshot
-                screenshot_result = self.run_adb_command(['shell', 'screencap', '-p', '/sdcard/screenshot.png'], timeout_seconds=10)
+            except Exception as e:
+                print(f"Screenshot attempt {attempt_num + 1} failed: {e}")
                 time.sleep(1)
 
-                # Transfer screenshot to local
-                transfer_result = self.run_adb_command(['pull', '/sdcard/screenshot.png', output_path], timeout_seconds=10)
-                time.sleep(0.5)
+        return None
 
-                # Clean up device storage
-                self.run_adb_command(['shell', 'rm', '/sdcard/screenshot.png'])
+    def capture_device_screenshot(self, output_path: str) -> Optional[bytes]:
+        """Capture device screenshot to file, returning the PNG bytes"""
+        png_bytes = self.capture_screenshot_bytes()
+        if png_bytes is None:
+            return None
 
-                # Verify file integrity
-                if os.path.exists(output_path) and os.path.getsize(output_path) > 1000:
-                    capture_successful = True
-                    break
+        try:
+            with open(output_path, 'wb') as screenshot_file:
+                screenshot_file.write(png_bytes)
+        except Exception as e:
+            print(f"Failed to save screenshot: {e}")
+            return None
 
-            except Exception as e:
-                print(f"Screenshot attempt {attempt_num + 1} failed: {e}")
-                time.sleep(1)
-        
-        return capture_successful
+        return png_bytes
 
     def capture_ui_hierarchy(self, output_path: str) -> bool:
         """Capture UI hierarchy dump with retry mechanism"""
         capture_successful = False
         for attempt_num in range(2):
             try:
-                # Clean up any existing files
-                self.run_adb_command(['shell', 'rm', '/sdcard/ui_dump.xml'])
-                time.sleep(0.5)
-
-                # Generate UI dump
-                dump_result = self.run_adb_command(['shell', 'uiautomator', 'dump', '/sdcard/ui_dump.xml'],
-                                                 timeout_seconds=15)
-                time.sleep(1)
+                # Clean up and generate UI dump in a single shell invocation
+                dump_result = self._exec_shell('rm -f /sdcard/ui_dump.xml; uiautomator dump /sdcard/ui_dump.xml',
+                                             timeout_seconds=15)
 
                 # Transfer UI dump to local
                 transfer_result = self.run_adb_command(['pull', '/sdcard/ui_dump.xml', output_path], timeout_seconds=10)
-                time.sleep(0.5)
 
                 # Clean up device storage
-                self.run_adb_command(['shell', 'rm', '/sdcard/ui_dump.xml'])
+                self._exec_shell('rm /sdcard/ui_dump.xml')
 
-                # Verify file exists
-                if os.path.exists(output_path) and os.path.getsize(output_path) > 100:
-                    capture_successful = True
-                    break
+                # Verify file exists (single stat instead of exists+getsize)
+                try:
+                    if os.stat(output_path).st_size > 100:
+                        capture_successful = True
+                        break
+                except FileNotFoundError:
+                    pass
 
             except Exception as e:
                 print(f"UI dump attempt {attempt_num + 1} failed: {e}")
@@ -116,41 +193,78 @@ class AndroidController:
         
         return capture_successful
 
+    def capture_state(self, screenshot_path: str, ui_dump_path: str) -> Tuple[Optional[bytes], bool]:
+        """Capture screenshot and UI hierarchy concurrently"""
+        # Screenshot (exec-out) and UI dump (persistent shell) are independent
+        # device resources, so the two sequences can overlap
+        screenshot_future = self._capture_executor.submit(self.capture_device_screenshot, screenshot_path)
+        ui_dump_future = self._capture_executor.submit(self.capture_ui_hierarchy, ui_dump_path)
+        return screenshot_future.result(), ui_dump_future.result()
+
+    def _wait_for_idle(self, timeout_seconds: float = 2.0):
+        """Wait for the UI to settle by polling the focused window"""
+        # ADB blocks until input commands are dispatched, so a fixed sleep
+        # only covers UI settle time; poll until the focus string stabilizes
+        poll_deadline = time.time() + timeout_seconds
+        previous_focus = None
+        while time.time() < poll_deadline:
+            current_focus = self._exec_shell('dumpsys window displays | grep mCurrentFocus',
+                                           timeout_seconds=2)
+            if current_focus and current_focus == previous_focus:
+                return
+            previous_focus = current_focus
+            time.sleep(0.05)
+
     def perform_tap_action(self, x_coordinate: int, y_coordinate: int):
         """Execute tap action on device"""
-        self.run_adb_command(['shell', 'input', 'tap', str(x_coordinate), str(y_coordinate)])
-        time.sleep(2)
+        self._exec_shell(f'input tap {x_coordinate} {y_coordinate}')
+        self._wait_for_idle()
 
     def perform_text_input(self, input_text: str):
         """Execute text input with improved handling"""
-        # Escape special characters for shell
-        escaped_text = input_text.replace(' ', '%s').replace('&', '\\&').replace('(', '\\(').replace(')', '\\)')
-        self.run_adb_command(['shell', 'input', 'text', escaped_text])
-        time.sleep(2)
+        # Long strings: paste via clipboard in one shot instead of per-keystroke
+        # injection (`input text` types ~40-100 ms per character on device)
+        if len(input_text) > 20 and self._paste_via_clipboard(input_text):
+            self._exec_shell('input keyevent KEYCODE_ENTER')
+            self._wait_for_idle()
+            return
+
+        # Escape special characters for shell in a single translate pass
+        escaped_text = input_text.translate(_SHELL_ESCAPE_TABLE)
+        self._exec_shell(f'input text {escaped_text}')
 
         # Send enter key
-        self.run_adb_command(['shell', 'input', 'keyevent', 'KEYCODE_ENTER'])
-        time.sleep(2)
+        self._exec_shell('input keyevent KEYCODE_ENTER')
+        self._wait_for_idle()
+
+    def _paste_via_clipboard(self, input_text: str) -> bool:
+        """Attempt to set the device clipboard and paste; returns False if unsupported"""
+        quoted_text = input_text.replace("'", "'\\''")
+        self._exec_shell(f"cmd clipboard set-primary-clip '{quoted_text}'")
+
+        # Failure text varies across devices, so require positive confirmation:
+        # only paste if the clip actually reads back with our text
+        readback_result = self._exec_shell('cmd clipboard get-primary-clip')
+        if input_text not in readback_result:
+            return False
+        self._exec_shell('input keyevent 279')  # KEYCODE_PASTE
+        return True
 
     def perform_scroll_action(self, scroll_direction: str = 'down'):
         """Execute scroll action on device"""
         if scroll_direction.lower() == 'up':
-            self.run_adb_command(['shell', 'input', 'swipe', '500', '300', '500', '1000'])
+            self._exec_shell('input swipe 500 300 500 1000')
         else:  # default down
-            self.run_adb_command(['shell', 'input', 'swipe', '500', '1000', '500', '300'])
-        time.sleep(2)
+            self._exec_shell('input swipe 500 1000 500 300')
+        self._wait_for_idle()
 
     def launch_application(self, app_package_name: str) -> bool:
         """Launch application by package name"""
 
         try:
-            # Force stop application for clean start
-            self.run_adb_command(['shell', 'am', 'force-stop', app_package_name])
-            time.sleep(2)
-
-            # Launch application
-            launch_result = self.run_adb_command(['shell', 'monkey', '-p', app_package_name, '-c',
-                                               'android.intent.category.LAUNCHER', '1'])
+            # Force stop and relaunch in a single shell invocation for clean start
+            launch_result = self._exec_shell(f'am force-stop {app_package_name}; '
+                                           f'monkey -p {app_package_name} -c android.intent.category.LAUNCHER 1')
             time.sleep(5)  # Wait for app to load
             return True
         except Exception as e:
@@ -1,49 +1,76 @@
-import hashlib
 import os
+import re
+import xxhash
 from typing import Dict, List
 
+# Module-level app lookup tables (hoisted so they are built once, not per call)
+_SUPPORTED_APPS = {
+    'flipkart': 'flipkart',
+    'amazon': 'amazon',
+    'blinkit': 'blinkit',
+    'zomato': 'zomato',
+    'ola': 'ola'
+}
+
+_PACKAGE_MAPPING = {
+    'flipkart': 'com.flipkart.android',
+    'amazon': 'in.amazon.mShop.android.shopping',
+    'blinkit': 'com.grofers.customerapp',
+    'zomato': 'com.application.zomata',
+    'ola': 'com.olacabs.customer'
+}
+
+# One compiled alternation scans the instruction once for any supported app;
+# 'ola' is word-bounded so it cannot match inside words like 'chocolates'
+_APP_KEYWORD_PATTERN = re.compile(r'flipkart|amazon|blinkit|zomato|\bola\b')
+
 
 class AppUtilities:
     """Utility functions for the mobile automation agent"""
-    
+
     @staticmethod
-    def calculate_screen_hash(image_file_path: str) -> str:
-        """Generate MD5 hash for screen image to detect loops"""
+    def calculate_screen_hash(screen_image) -> str:
+        """Generate xxh3 fingerprint for screen image (bytes or file path) to detect loops"""
+        # Loop detection only needs a high-probability fingerprint, so for
+        # large images only size + first/last 32 KiB are hashed instead of
+        # the full multi-MB PNG payload
         try:
-            with open(image_file_path, 'rb') as image_file:
-                return hashlib.md5(image_file.read()).hexdigest()
+            if isinstance(screen_image, bytes):
+                image_size = len(screen_image)
+                if image_size <= 65536:
+                    return xxhash.xxh3_64(screen_image).hexdigest()
+                screen_hasher = xxhash.xxh3_64(image_size.to_bytes(8, 'little'))
+                screen_hasher.update(screen_image[:32768])
+                screen_hasher.update(screen_image[-32768:])
+                return screen_hasher.hexdigest()
+
+            with open(screen_image, 'rb') as image_file:
+                image_size = os.fstat(image_file.fileno()).st_size
+                if image_size <= 65536:
+                    return xxhash.xxh3_64(image_file.read()).hexdigest()
+                screen_hasher = xxhash.xxh3_64(image_size.to_bytes(8, 'little'))
+                screen_hasher.update(image_file.read(32768))
+                image_file.seek(-32768, os.SEEK_END)
+                screen_hasher.update(image_file.read())
+            return screen_hasher.hexdigest()
         except:
             return ""
     
     @staticmethod
     def extract_app_identifier(task_instruction: str) -> str:
         """Extract target app name from task instruction"""
-        instruction_text = task_instruction.lower()
-        supported_apps = {
-            'flipkart': 'flipkart', 
-            'amazon': 'amazon', 
-            'blinkit': 'blinkit',
-            'zomato': 'zomato', 
-            'ola': 'ola'
-        }
-
-        for app_keyword in supported_apps:
-            if app_keyword in instruction_text:
-                return supported_apps[app_keyword]
+        matched_keywords = set(_APP_KEYWORD_PATTERN.findall(task_instruction.casefold()))
+        # Resolve multi-app mentions in declaration order, matching the
+        # priority of the original ordered scan
+        for app_keyword in _SUPPORTED_APPS:
+            if app_keyword in matched_keywords:
+                return _SUPPORTED_APPS[app_keyword]
         return 'unknown'
-    
+
     @staticmethod
     def get_app_package_name(app_identifier: str) -> str:
         """Get Android package name for app identifier"""
-        package_mapping = {
-            'flipkart': 'com.flipkart.android',
-            'amazon': 'in.amazon.mShop.android.shopping',
-            'blinkit': 'com.grofers.customerapp',
-            'zomato': 'com.application.zomata',
-            'ola': 'com.olacabs.customer'
-        }
-        
-        return package_mapping.get(app_identifier.lower(), app_identifier)
+        return _PACKAGE_MAPPING.get(app_identifier.casefold(), app_identifier)
     
     @staticmethod
     def get_predefined_fallback_actions() -> List[str]:
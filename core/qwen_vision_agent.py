@@ -1,11 +1,58 @@
-import base64
+import binascii
+import httpx
+import orjson
 import requests
 import re
-import os
 from PIL import Image
 import io
 from typing import Tuple, Optional
 
+# Optional libjpeg-turbo encoder (SIMD paths, 2-4x faster than stock libjpeg);
+# falls back to PIL's encoder when PyTurboJPEG or the native library is missing
+try:
+    import numpy
+    from turbojpeg import TurboJPEG, TJPF_RGB
+    _turbo_jpeg_encoder = TurboJPEG()
+except Exception:
+    _turbo_jpeg_encoder = None
+
+# Pre-compiled action patterns (hot path - parsed on every model response)
+_TAP_PATTERN = re.compile(r'TAP\s*\((\d+),\s*(\d+)\)')
+_TYPE_PATTERN = re.compile(r"TYPE\s*['\"]([^'\"]+)['\"]")
+
+# Single alternation classifies a response line in one scan instead of
+# four independent pattern starts; dispatch on whichever group matched
+_ACTION_PATTERN = re.compile(
+    r"TAP\s*\((?P<tap_x>\d+),\s*(?P<tap_y>\d+)\)"
+    r"|(?P<type>TYPE\s*['\"])"
+    r"|(?P<scroll>(?i:scroll))"
+    r"|(?P<done>(?i:task_complete))"
+)
+
+
+def _classify_response_line(line: str):
+    """Return the highest-priority action match on a response line
+
+    Models sometimes emit lines like 'scroll down or TAP (10,20)'; ranking
+    every alternation hit as TAP > TYPE > SCROLL > TASK_COMPLETE preserves
+    the original cascade order instead of taking the leftmost token.
+    """
+    best_match = None
+    best_rank = 4
+    for candidate_match in _ACTION_PATTERN.finditer(line):
+        if candidate_match['tap_x'] is not None:
+            return candidate_match
+        if candidate_match['type'] is not None:
+            candidate_rank = 1
+        elif candidate_match['scroll'] is not None:
+            candidate_rank = 2
+        else:
+            candidate_rank = 3
+        if candidate_rank < best_rank:
+            best_match = candidate_match
+            best_rank = candidate_rank
+    return best_match
+
 
 class QwenVisionAgent:
     """Handles Qwen vision model processing for UI understanding"""
@@ -14,83 +61,111 @@ class QwenVisionAgent:
         self.api_token = api_token
         self.api_endpoint = "https://router.huggingface.co/v1/chat/completions"
         self.model_name = "Qwen/Qwen2.5-VL-32B-Instruct"
+        self._jpeg_buffer = io.BytesIO()  # Reused across steps to avoid per-call allocation
+        # Persistent session reuses the TLS connection across steps
+        self._session = requests.Session()
+        self._session.mount(self.api_endpoint, requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self._session.headers.update({
+            "Authorization": f"Bearer {self.api_token}",
+            "Content-Type": "application/json"
+        })
+        # Async client for callers that overlap the API wait with device I/O
+        self._async_client = httpx.AsyncClient(headers=dict(self._session.headers), timeout=35)
     
     def compress_and_encode_image(self, image_file_path: str, max_dimension: int = 1024, jpeg_quality: int = 85) -> tuple:
-        """Compress image and return base64 encoded data with scaling factors"""
+        """Compress image and return a base64 data URL with scaling factors"""
         try:
             # Load and process image
             original_image = Image.open(image_file_path)
             original_dimensions = original_image.size  # (width, height)
-            rgb_image = original_image.convert("RGB")  # Ensure JPEG compatibility
+            # Only convert when needed - screenshots are usually already RGB(A)
+            rgb_image = original_image.convert("RGB") if original_image.mode != "RGB" else original_image
 
-            # Resize while maintaining aspect ratio
-            rgb_image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+            # Resize while maintaining aspect ratio; bilinear is plenty for a
+            # model input that gets re-resized downstream anyway
+            rgb_image.thumbnail((max_dimension, max_dimension), Image.Resampling.BILINEAR)
             compressed_dimensions = rgb_image.size  # (width, height)
 
             # Calculate coordinate scaling factors
             width_scale_factor = original_dimensions[0] / compressed_dimensions[0] if compressed_dimensions[0] > 0 else 1.0
             height_scale_factor = original_dimensions[1] / compressed_dimensions[1] if compressed_dimensions[1] > 0 else 1.0
 
-            # Encode to base64
-            image_buffer = io.BytesIO()
-            rgb_image.save(image_buffer, format="JPEG", quality=jpeg_quality)
-            encoded_image_data = base64.b64encode(image_buffer.getvalue()).decode("utf-8")
+            # Encode to JPEG, preferring the SIMD-accelerated turbojpeg path
+            if _turbo_jpeg_encoder is not None:
+                # PIL hands over RGB; the default pixel format is BGR, which
+                # would swap channels in every screenshot sent to the model
+                jpeg_bytes = _turbo_jpeg_encoder.encode(numpy.asarray(rgb_image), quality=jpeg_quality,
+                                                        pixel_format=TJPF_RGB)
+            else:
+                self._jpeg_buffer.seek(0)
+                self._jpeg_buffer.truncate(0)
+                rgb_image.save(self._jpeg_buffer, format="JPEG", quality=jpeg_quality, optimize=False)
+                jpeg_bytes = self._jpeg_buffer.getvalue()
 
-            return encoded_image_data, width_scale_factor, height_scale_factor
+            # Single-pass base64 (no intermediate bytes object from b64encode)
+            # with the data-URL prefix built here so callers don't re-concat
+            encoded_image_data = binascii.b2a_base64(jpeg_bytes, newline=False).decode("ascii")
+            image_data_url = "data:image/jpeg;base64," + encoded_image_data
+
+            return image_data_url, width_scale_factor, height_scale_factor
 
         except Exception as e:
             print(f"Image processing failed: {e}")
             return None, 1.0, 1.0
 
+    def _build_request_payload(self, image_data_url: str, user_prompt: str) -> dict:
+        """Build the chat-completions payload for a screenshot and prompt"""
+        return {
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": user_prompt},
+                        {
+                            "type": "image_url",
+                            "image_url": {"url": image_data_url}
+                        }
+                    ]
+                }
+            ],
+            "model": self.model_name,
+            "max_tokens": 300,
+            "temperature": 0.2
+        }
+
+    def _parse_api_response(self, status_code: int, response_content: bytes) -> Optional[str]:
+        """Extract the model response text from an API reply"""
+        if status_code != 200:
+            print(f"API error: {status_code} - {response_content}")
+            return None
+
+        response_data = orjson.loads(response_content)
+        if "choices" in response_data and len(response_data["choices"]) > 0:
+            return response_data["choices"][0]["message"]["content"].strip()
+
+        print(f"No response choices from Qwen model")
+        return None
+
     def query_qwen_vision_model(self, image_file_path: str, user_prompt: str) -> tuple:
         """Query Qwen vision model with image and prompt"""
-        if not image_file_path or not os.path.exists(image_file_path):
+        if not image_file_path:
             return None, 1.0, 1.0
 
-        # Process image
+        # Process image (Image.open stats the file itself; a missing file is
+        # caught inside compress_and_encode_image)
         processing_result = self.compress_and_encode_image(image_file_path)
         if processing_result[0] is None:
             return None, 1.0, 1.0
 
-        encoded_image_data, width_scale_factor, height_scale_factor = processing_result
+        image_data_url, width_scale_factor, height_scale_factor = processing_result
 
         try:
-            request_headers = {
-                "Authorization": f"Bearer {self.api_token}",
-                "Content-Type": "application/json"
-            }
-
-            request_payload = {
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": user_prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {"url": f"data:image/jpeg;base64,{encoded_image_data}"}
-                            }
-                        ]
-                    }
-                ],
-                "model": self.model_name,
-                "max_tokens": 300,
-                "temperature": 0.2
-            }
-
-            api_response = requests.post(self.api_endpoint, headers=request_headers, json=request_payload, timeout=35)
-
-            if api_response.status_code == 200:
-                response_data = api_response.json()
-                if "choices" in response_data and len(response_data["choices"]) > 0:
-                    model_response = response_data["choices"][0]["message"]["content"]
-                    return model_response.strip(), width_scale_factor, height_scale_factor
-                else:
-                    print(f"No response choices from Qwen model")
-                    return None, 1.0, 1.0
-            else:
-                print(f"API error: {api_response.status_code} - {api_response.text}")
-                return None, 1.0, 1.0
+            request_payload = self._build_request_payload(image_data_url, user_prompt)
+
+            # orjson escapes the large base64 string far faster than stdlib json
+            api_response = self._session.post(self.api_endpoint, data=orjson.dumps(request_payload), timeout=35)
+            model_response = self._parse_api_response(api_response.status_code, api_response.content)
+            return model_response, width_scale_factor, height_scale_factor
 
         except requests.exceptions.Timeout:
             print(f"Qwen model request timeout")
@@ -99,11 +174,35 @@ class QwenVisionAgent:
             print(f"Qwen model error: {e}")
             return None, 1.0, 1.0
 
+    async def query_qwen_vision_model_async(self, image_file_path: str, user_prompt: str) -> tuple:
+        """Async variant of query_qwen_vision_model for overlapping device I/O"""
+        if not image_file_path:
+            return None, 1.0, 1.0
+
+        processing_result = self.compress_and_encode_image(image_file_path)
+        if processing_result[0] is None:
+            return None, 1.0, 1.0
+
+        image_data_url, width_scale_factor, height_scale_factor = processing_result
+
+        try:
+            request_payload = self._build_request_payload(image_data_url, user_prompt)
+            api_response = await self._async_client.post(self.api_endpoint, content=orjson.dumps(request_payload))
+            model_response = self._parse_api_response(api_response.status_code, api_response.content)
+            return model_response, width_scale_factor, height_scale_factor
+
+        except httpx.TimeoutException:
+            print(f"Qwen model request timeout")
+            return None, 1.0, 1.0
+        except Exception as e:
+            print(f"Qwen model error: {e}")
+            return None, 1.0, 1.0
+
     def extract_action_from_response(self, model_response: str, width_scale_factor: float, height_scale_factor: float) -> Optional[str]:
         """Parse action command from model response and scale coordinates"""
         response_lines = model_response.strip().split('\n')
 
-        # Look for valid action patterns
+        # Look for valid action patterns (one classifying scan per line)
         for line in response_lines:
             line = line.strip()
 
@@ -111,44 +210,46 @@ class QwenVisionAgent:
             if not line or line.startswith('#') or line.startswith('```'):
                 continue
 
+            action_match = _classify_response_line(line)
+            if action_match is None:
+                continue
+
             # Parse TAP actions and scale coordinates
-            tap_pattern = re.search(r'TAP\s*\((\d+),\s*(\d+)\)', line)
-            if tap_pattern:
-                original_x, original_y = int(tap_pattern.group(1)), int(tap_pattern.group(2))
-                scaled_x = int(original_x * width_scale_factor)
-                scaled_y = int(original_y * height_scale_factor)
+            if action_match['tap_x'] is not None:
+                scaled_x = int(int(action_match['tap_x']) * width_scale_factor)
+                scaled_y = int(int(action_match['tap_y']) * height_scale_factor)
                 comment_text = line.split('#', 1)[1].strip() if '#' in line else "scaled coordinates"
                 return f"TAP ({scaled_x},{scaled_y}) # {comment_text}"
 
-            elif re.search(r"TYPE\s*['\"]", line):
-                return line
-            elif 'SCROLL' in line.upper():
-                return line
-            elif 'TASK_COMPLETE' in line.upper():
-                return line
+            # TYPE / SCROLL / TASK_COMPLETE lines pass through verbatim
+            return line
 
         # Fallback parsing from full response
         full_response_text = model_response.strip()
+        full_response_lowered = full_response_text.casefold()
 
-        # Extract and scale TAP coordinates
-        tap_pattern = re.search(r'TAP\s*\((\d+),\s*(\d+)\)', full_response_text)
-        if tap_pattern:
-            original_x, original_y = int(tap_pattern.group(1)), int(tap_pattern.group(2))
-            scaled_x = int(original_x * width_scale_factor)
-            scaled_y = int(original_y * height_scale_factor)
-            return f"TAP ({scaled_x},{scaled_y}) # extracted and scaled"
+        # Extract and scale TAP coordinates (substring gate keeps the regex
+        # engine out of responses that clearly contain no TAP token)
+        if 'TAP' in full_response_text:
+            tap_pattern = _TAP_PATTERN.search(full_response_text)
+            if tap_pattern:
+                original_x, original_y = int(tap_pattern.group(1)), int(tap_pattern.group(2))
+                scaled_x = int(original_x * width_scale_factor)
+                scaled_y = int(original_y * height_scale_factor)
+                return f"TAP ({scaled_x},{scaled_y}) # extracted and scaled"
 
         # Extract TYPE commands
-        type_pattern = re.search(r"TYPE\s*['\"]([^'\"]+)['\"]", full_response_text)
-        if type_pattern:
-            return f"TYPE '{type_pattern.group(1)}' # extracted action"
+        if 'TYPE' in full_response_text:
+            type_pattern = _TYPE_PATTERN.search(full_response_text)
+            if type_pattern:
+                return f"TYPE '{type_pattern.group(1)}' # extracted action"
 
         # Extract SCROLL commands
-        if 'SCROLL' in full_response_text.upper():
+        if 'scroll' in full_response_lowered:
             return "SCROLL down # extracted action"
 
         # Extract completion signals
-        if 'TASK_COMPLETE' in full_response_text.upper():
+        if 'task_complete' in full_response_lowered:
             return "TASK_COMPLETE: extracted from response"
 
         return None
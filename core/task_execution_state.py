@@ -1,5 +1,10 @@
+import re
+from collections import deque
 from typing import List
 
+# Single-pass matcher for search-progress keywords (one scan instead of five)
+_PROGRESS_PATTERN = re.compile(r'search|input|field|box|bar', re.IGNORECASE)
+
 
 class TaskExecutionState:
     """Manages execution state and progress tracking"""
@@ -14,8 +19,8 @@ class TaskExecutionState:
         self.search_initiated = False
         self.query_entered = False
         
-        # Loop detection mechanism
-        self.screen_hash_history = []
+        # Loop detection mechanism (ring buffer, O(1) append with eviction)
+        self.screen_hash_history = deque(maxlen=5)
         
     def initialize_new_task(self, task_description: str):
         """Initialize state for new task execution"""
@@ -23,7 +28,7 @@ class TaskExecutionState:
         self.current_step_number = 0
         self.search_initiated = False
         self.query_entered = False
-        self.screen_hash_history = []
+        self.screen_hash_history.clear()
     
     def advance_step_counter(self):
         """Increment the current step number"""
@@ -36,17 +41,15 @@ class TaskExecutionState:
     def record_screen_hash(self, screen_hash: str):
         """Record screen hash for loop detection"""
         self.screen_hash_history.append(screen_hash)
-        # Keep only recent hashes for efficiency
-        self.screen_hash_history = self.screen_hash_history[-5:]
     
     def detect_screen_loop(self, current_screen_hash: str) -> bool:
         """Detect if we're stuck in a screen loop"""
-        return current_screen_hash in self.screen_hash_history[-3:]  # Same screen appeared 3 times
+        recent_hashes = list(self.screen_hash_history)[-3:]
+        return current_screen_hash in recent_hashes  # Same screen appeared 3 times
     
     def update_task_progress(self, executed_action: str):
         """Update task progress based on executed action"""
-        if 'TAP' in executed_action and any(search_keyword in executed_action.lower() 
-                                          for search_keyword in ['search', 'input', 'field', 'box', 'bar']):
+        if 'TAP' in executed_action and _PROGRESS_PATTERN.search(executed_action):
             self.search_initiated = True
         elif 'TYPE' in executed_action:
             self.query_entered = True 
\ No newline at end of file
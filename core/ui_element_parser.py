@@ -1,102 +1,191 @@
-import xml.etree.ElementTree as ET
+import heapq
 import re
-import os
+import xxhash
+from collections import OrderedDict
+from itertools import islice
+from operator import itemgetter
 from typing import Dict, List, Optional
 
+# lxml's C-backed iterparse avoids Python-level tree recursion on large
+# hierarchy dumps; fall back to stdlib ElementTree when it is unavailable
+try:
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_etree = None
+import xml.etree.ElementTree as ET
+
+def _parse_bounds(element_bounds: str):
+    """Parse '[x1,y1][x2,y2]' into four ints without the regex engine
+
+    str.partition/isdigit/int are all C-level scans, and malformed bounds
+    take an explicit branch instead of raising - exception setup is far
+    more expensive than a comparison when dumps contain many decoration
+    nodes with odd bounds.
+    """
+    left_pair, separator, right_pair = element_bounds.partition('][')
+    if not separator or not left_pair.startswith('[') or not right_pair.endswith(']'):
+        return None
+    top_left_x, first_comma, top_left_y = left_pair[1:].partition(',')
+    bottom_right_x, second_comma, bottom_right_y = right_pair[:-1].partition(',')
+    if not (first_comma and second_comma and top_left_x.isdigit() and top_left_y.isdigit()
+            and bottom_right_x.isdigit() and bottom_right_y.isdigit()):
+        return None
+    return int(top_left_x), int(top_left_y), int(bottom_right_x), int(bottom_right_y)
+
+
+# Search-relevance keywords compiled to one alternation so each element's
+# combined text is scanned once, with weights looked up per matched token
+_SEARCH_KEYWORD_PATTERN = re.compile(r'search|find|query|input|magnify|glass')
+_SEARCH_KEYWORD_SCORES = {
+    'search': 5,
+    'find': 5,
+    'query': 3,
+    'input': 3,
+    'magnify': 2,
+    'glass': 2
+}
+
+# Format skeleton built once; the string itself is only rendered for the
+# element that actually wins selection
+_TAP_ACTION_TEMPLATE = "TAP ({},{}) # {}"
+
 
 class UIElementParser:
     """Analyzes UI hierarchy and identifies interactive elements"""
-    
+
     def __init__(self):
-        pass
-    
-    def parse_ui_hierarchy(self, xml_file_path: str) -> List[Dict]:
-        """Parse UI hierarchy XML and extract interactive elements"""
-        if not xml_file_path or not os.path.exists(xml_file_path):
+        # Memoized parse results keyed by screen hash; repeated screens
+        # (exactly the loop-recovery case) skip the XML parse entirely
+        self._parse_cache = OrderedDict()
+        self._parse_cache_size = 32
+        # lxml parsers are reusable; building one per parse_ui_hierarchy call
+        # costs more than the parse itself on small dumps
+        self._lxml_parser = lxml_etree.XMLParser(recover=True, collect_ids=False) if lxml_etree is not None else None
+        # xxh3 of the previously parsed dump; stationary screens often
+        # produce byte-identical XML, which skips the parse entirely
+        self._last_xml_fingerprint = None
+        self._last_parse_result = None
+
+    def parse_ui_hierarchy(self, xml_file_path: str, cache_key: Optional[str] = None) -> List[Dict]:
+        """Parse UI hierarchy XML and extract interactive elements
+
+        When cache_key (typically the screen hash) is given, results for
+        previously seen screens are returned from an LRU cache.
+        """
+        if not xml_file_path:
             return []
 
+        if cache_key is not None:
+            cached_elements = self._parse_cache.get(cache_key)
+            if cached_elements is not None:
+                self._parse_cache.move_to_end(cache_key)
+                return cached_elements
+
+        # Single read serves the existence check, the fingerprint and the
+        # parse (dumps are small, and lxml parses bytes faster than a path)
         try:
-            xml_tree = ET.parse(xml_file_path)
-            root_element = xml_tree.getroot()
-            parsed_elements = []
-
-            def extract_element_data(xml_node, element_list):
-                node_attributes = xml_node.attrib
-                is_clickable = node_attributes.get('clickable', 'false') == 'true'
-                is_scrollable = node_attributes.get('scrollable', 'false') == 'true'
-                element_text = node_attributes.get('text', '').strip()
-                content_description = node_attributes.get('content-desc', '').strip()
-                resource_identifier = node_attributes.get('resource-id', '').strip()
-                element_class = node_attributes.get('class', '').strip()
-                element_bounds = node_attributes.get('bounds', '')
-
-                if element_bounds:
-                    try:
-                        coordinate_matches = re.findall(r'\[(\d+),(\d+)\]', element_bounds)
-                        if len(coordinate_matches) == 2:
-                            top_left_x, top_left_y = map(int, coordinate_matches[0])
-                            bottom_right_x, bottom_right_y = map(int, coordinate_matches[1])
-                            center_x = (top_left_x + bottom_right_x) // 2
-                            center_y = (top_left_y + bottom_right_y) // 2
-
-                            # Include element if it has useful information
-                            if (is_clickable or is_scrollable or element_text or content_description) and center_x > 0 and center_y > 0:
-                                element_list.append({
-                                    'center_x': center_x,
-                                    'center_y': center_y,
-                                    'display_text': element_text,
-                                    'content_description': content_description,
-                                    'resource_id': resource_identifier,
-                                    'element_class': element_class,
-                                    'is_clickable': is_clickable,
-                                    'is_scrollable': is_scrollable,
-                                    'bounds_string': element_bounds,
-                                    'element_width': bottom_right_x - top_left_x,
-                                    'element_height': bottom_right_y - top_left_y
-                                })
-                    except:
-                        pass
-
-                for child_node in xml_node:
-                    extract_element_data(child_node, element_list)
-
-            extract_element_data(root_element, parsed_elements)
+            with open(xml_file_path, 'rb') as xml_file:
+                xml_content = xml_file.read()
+        except OSError:
+            return []
+
+        # Full-content xxh3 short-circuits the parse when uiautomator dumped
+        # the exact same hierarchy as last step; prefix/size checks are not
+        # enough because dumps from one app share their opening bytes
+        xml_fingerprint = xxhash.xxh3_64_intdigest(xml_content)
+        if xml_fingerprint == self._last_xml_fingerprint and self._last_parse_result is not None:
+            return self._last_parse_result
+
+        parsed_elements = []
+        try:
+            if lxml_etree is not None:
+                # Reused parser + C-level iter('node') keeps the walk out of
+                # Python recursion; the whole tree is dropped after this loop
+                xml_root = lxml_etree.fromstring(xml_content, self._lxml_parser)
+                for xml_node in xml_root.iter('node'):
+                    self._extract_element_data(xml_node.attrib, parsed_elements)
+            else:
+                xml_root = ET.fromstring(xml_content)
+                for xml_node in xml_root.iter():
+                    self._extract_element_data(xml_node.attrib, parsed_elements)
+
+            if cache_key is not None:
+                self._parse_cache[cache_key] = parsed_elements
+                if len(self._parse_cache) > self._parse_cache_size:
+                    self._parse_cache.popitem(last=False)
+            self._last_xml_fingerprint = xml_fingerprint
+            self._last_parse_result = parsed_elements
             return parsed_elements
 
         except Exception as e:
             print(f"Error parsing UI hierarchy: {e}")
             return []
 
+    def _extract_element_data(self, node_attributes, element_list: List[Dict]):
+        """Extract one node's attributes into an element dict if it is useful"""
+        element_bounds = node_attributes.get('bounds', '')
+        if not element_bounds:
+            return
+
+        parsed_bounds = _parse_bounds(element_bounds)
+        if parsed_bounds is None:
+            return
+
+        is_clickable = node_attributes.get('clickable', 'false') == 'true'
+        is_scrollable = node_attributes.get('scrollable', 'false') == 'true'
+        element_text = node_attributes.get('text', '').strip()
+        content_description = node_attributes.get('content-desc', '').strip()
+
+        top_left_x, top_left_y, bottom_right_x, bottom_right_y = parsed_bounds
+        element_width = bottom_right_x - top_left_x
+        center_x = (top_left_x + bottom_right_x) // 2
+        center_y = (top_left_y + bottom_right_y) // 2
+
+        # Include element if it has useful information
+        if (is_clickable or is_scrollable or element_text or content_description) and center_x > 0 and center_y > 0:
+            resource_identifier = node_attributes.get('resource-id', '').strip()
+            element_class = node_attributes.get('class', '').strip()
+            # Lowercase views computed once here so the scoring and filter
+            # loops never re-fold the same strings
+            text_lowered = element_text.lower()
+            description_lowered = content_description.lower()
+            resource_lowered = resource_identifier.lower()
+            element_list.append({
+                'center_x': center_x,
+                'center_y': center_y,
+                'display_text': element_text,
+                'content_description': content_description,
+                'resource_id': resource_identifier,
+                'element_class': element_class,
+                'is_clickable': is_clickable,
+                'is_scrollable': is_scrollable,
+                'bounds_string': element_bounds,
+                'element_width': element_width,
+                'element_height': bottom_right_y - top_left_y,
+                # Tap-candidate mask evaluated once here so downstream
+                # filters are a single dict lookup per element
+                '_tap_candidate': is_clickable and element_width > 100,
+                '_text_lc': text_lowered,
+                '_desc_lc': description_lowered,
+                '_rid_lc': resource_lowered,
+                '_class_lc': element_class.lower(),
+                '_content_lc': f"{text_lowered} {description_lowered}",
+                '_combined_lc': f"{text_lowered} {description_lowered} {resource_lowered}"
+            })
+
     def identify_search_elements(self, element_list: List[Dict]) -> List[Dict]:
         """Identify search-related UI elements with scoring"""
         search_candidates = []
 
         for element in element_list:
-            text_content = element['display_text'].lower()
-            description_content = element['content_description'].lower()
-            resource_content = element['resource_id'].lower()
-
-            # Combined text analysis
-            combined_text = f"{text_content} {description_content} {resource_content}"
-
-            relevance_score = 0
-
-            # High priority search indicators
-            if any(search_keyword in combined_text for search_keyword in ['search', 'find']):
-                relevance_score += 5
+            # One scan over the combined text yields every keyword hit
+            matched_keywords = set(_SEARCH_KEYWORD_PATTERN.findall(element['_combined_lc']))
+            relevance_score = sum(_SEARCH_KEYWORD_SCORES[keyword] for keyword in matched_keywords)
 
             # Input field identification
-            if 'edittext' in element['element_class'].lower():
+            if 'edittext' in element['_class_lc']:
                 relevance_score += 4
 
-            # Resource ID patterns
-            if any(id_keyword in resource_content for id_keyword in ['search', 'query', 'input']):
-                relevance_score += 3
-
-            # Icon and button indicators
-            if any(ui_keyword in combined_text for ui_keyword in ['search', 'magnify', 'glass']):
-                relevance_score += 2
-
             # Size filtering (exclude tiny elements)
             if element['element_width'] > 200 and element['element_height'] > 30:
                 relevance_score += 1
@@ -105,55 +194,39 @@ class UIElementParser:
                 element['search_relevance_score'] = relevance_score
                 search_candidates.append(element)
 
-        # Sort by relevance and return top candidates
-        search_candidates.sort(key=lambda x: x['search_relevance_score'], reverse=True)
-        return search_candidates[:5]
+        # Return top candidates by relevance (partial selection, no full
+        # sort; itemgetter keeps the key lookup in C)
+        return heapq.nlargest(5, search_candidates, key=itemgetter('search_relevance_score'))
 
     def get_clickable_elements(self, element_list: List[Dict]) -> List[Dict]:
         """Filter clickable elements for fallback actions"""
-        clickable_candidates = []
-        
-        for element in element_list:
-            if element['is_clickable'] and element['element_width'] > 100:
-                clickable_candidates.append(element)
-        
-        return clickable_candidates
+        return [element for element in element_list if element['_tap_candidate']]
 
     def find_elements_with_text(self, element_list: List[Dict], search_text: str) -> List[Dict]:
         """Find elements containing specific text"""
-        matching_elements = []
         search_term = search_text.lower()
-        
-        for element in element_list:
-            element_content = f"{element['display_text']} {element['content_description']}".lower()
-            if search_term in element_content:
-                matching_elements.append(element)
-        
-        return matching_elements
+        return [element for element in element_list if search_term in element['_content_lc']]
 
     def find_elements_by_class(self, element_list: List[Dict], class_name: str) -> List[Dict]:
         """Find elements by class name"""
-        matching_elements = []
         target_class = class_name.lower()
-        
-        for element in element_list:
-            if target_class in element['element_class'].lower():
-                matching_elements.append(element)
-        
-        return matching_elements
+        return [element for element in element_list if target_class in element['_class_lc']]
 
     def generate_fallback_action(self, element_list: List[Dict], step_number: int) -> Optional[str]:
         """Generate fallback action based on available elements"""
         if not element_list:
             return None
-        
-        # Prioritize clickable elements
-        clickable_elements = self.get_clickable_elements(element_list)
-        
-        if clickable_elements:
+
+        # Single filtered pass, stopping as soon as enough clickable
+        # candidates are seen to cycle by step number
+        clickable_candidates = (element for element in element_list if element['_tap_candidate'])
+        candidate_window = list(islice(clickable_candidates, step_number % 32 + 1))
+
+        if candidate_window:
             # Cycle through elements based on step number
-            selected_element = clickable_elements[step_number % len(clickable_elements)]
+            selected_element = candidate_window[step_number % len(candidate_window)]
             element_description = selected_element['display_text'] or selected_element['content_description'] or 'interactive element'
-            return f"TAP ({selected_element['center_x']},{selected_element['center_y']}) # {element_description[:30]}"
-        
+            return _TAP_ACTION_TEMPLATE.format(selected_element['center_x'], selected_element['center_y'],
+                                               element_description[:30])
+
         return None 
\ No newline at end of file
@@ -1,6 +1,6 @@
 import os
-import re
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Tuple, Optional
 from agent_config import get_agent_configuration
 
@@ -12,6 +12,9 @@ from core.action_coordinator import ActionCoordinator
 from core.app_utilities import AppUtilities
 from core.task_execution_state import TaskExecutionState
 
+# Format skeleton for search-element taps, built once at import
+_SEARCH_TAP_TEMPLATE = "TAP ({},{}) # Search: {}"
+
 
 class IntelligentMobileAgent:
     """AI-powered mobile automation agent using Qwen vision model"""
@@ -33,23 +36,29 @@ class IntelligentMobileAgent:
         self.qwen_vision_agent = QwenVisionAgent(api_token=self.agent_config.huggingface_api_token)
         self.ui_element_parser = UIElementParser()
         self.action_coordinator = ActionCoordinator(self.android_controller)
+        # Worker for overlapping the vision API wait with local parsing
+        self._api_executor = ThreadPoolExecutor(max_workers=1)
+        # Planned actions keyed by screen hash; a repeated screen reuses its
+        # prior plan instead of round-tripping to the vision model
+        self._action_cache = {}
         print("#" * 60)
         print("Intelligent Mobile Agent with Qwen Vision Ready!")
         print("#" * 60)
-    def capture_device_state(self) -> Tuple[str, str]:
+    def capture_device_state(self) -> Tuple[Optional[str], Optional[str], Optional[bytes]]:
         """Capture current device screen and UI hierarchy"""
         self.execution_state.advance_step_counter()
         screenshot_file_path = f"{self.screenshot_storage_dir}/step_{self.execution_state.current_step_number:02d}.png"
         ui_hierarchy_file_path = f"{self.ui_hierarchy_storage_dir}/step_{self.execution_state.current_step_number:02d}.xml"
-        
-        # Capture device screenshot
-        screenshot_captured = self.android_controller.capture_device_screenshot(screenshot_file_path)
-        
-        # Capture UI hierarchy
-        ui_hierarchy_captured = self.android_controller.capture_ui_hierarchy(ui_hierarchy_file_path)
-        
-        return (screenshot_file_path if screenshot_captured else None,
-                ui_hierarchy_file_path if ui_hierarchy_captured else None)
+
+        # Capture screenshot and UI hierarchy concurrently
+        # (screenshot bytes kept in memory for hashing)
+        screenshot_bytes, ui_hierarchy_captured = self.android_controller.capture_state(
+            screenshot_file_path, ui_hierarchy_file_path
+        )
+
+        return (screenshot_file_path if screenshot_bytes is not None else None,
+                ui_hierarchy_file_path if ui_hierarchy_captured else None,
+                screenshot_bytes)
     
     def execute_task_instruction(self, task_instruction: str) -> str:
         """Execute mobile automation task based on natural language instruction"""
@@ -59,6 +68,7 @@ class IntelligentMobileAgent:
         # Initialize task execution state
         self.execution_state.initialize_new_task(task_instruction)
         self.action_coordinator.reset_action_history()
+        self._action_cache.clear()
         
         # Identify and launch target application
         app_identifier = AppUtilities.extract_app_identifier(task_instruction)
@@ -71,34 +81,66 @@ class IntelligentMobileAgent:
         # Main task execution loop
         task_completion_achieved = False
         final_execution_result = ""
-        
+        loop_recovery_engaged = False
+        last_reused_screen_hash = None
+
         while not self.execution_state.has_reached_step_limit() and not task_completion_achieved:
             # Capture current device state
-            screenshot_path, ui_hierarchy_path = self.capture_device_state()
-            
+            screenshot_path, ui_hierarchy_path, screenshot_bytes = self.capture_device_state()
+
             # Check for screen navigation loops
+            current_screen_hash = None
             if screenshot_path:
-                current_screen_hash = AppUtilities.calculate_screen_hash(screenshot_path)
+                current_screen_hash = AppUtilities.calculate_screen_hash(screenshot_bytes)
                 if self.execution_state.detect_screen_loop(current_screen_hash):
                     print("Screen loop detected, attempting navigation recovery...")
+                    loop_recovery_engaged = True
                     self.android_controller.perform_scroll_action('down')
                     continue
                 self.execution_state.record_screen_hash(current_screen_hash)
-            
+
             action_to_execute = None
-            
+
+            # A replayed plan that left the screen unchanged is stale - drop
+            # it so the model gets consulted again
+            if current_screen_hash and current_screen_hash == last_reused_screen_hash:
+                self._action_cache.pop(current_screen_hash, None)
+            last_reused_screen_hash = None
+
+            # Reuse a prior plan only once loop recovery has engaged; until
+            # then every screen visit gets a fresh model decision
+            cached_planned_action = (self._action_cache.get(current_screen_hash)
+                                     if current_screen_hash and loop_recovery_engaged else None)
+
             # Primary: Use Qwen vision model for action planning
-            if screenshot_path:
+            # (submitted to a worker so the API wait overlaps local parsing)
+            qwen_query_future = None
+            if screenshot_path and cached_planned_action is None:
                 context_aware_prompt = self.qwen_vision_agent.generate_context_aware_prompt(
-                    task_instruction, 
+                    task_instruction,
                     self.execution_state.current_step_number,
                     self.execution_state.search_initiated,
                     self.execution_state.query_entered
                 )
-                qwen_response, width_scale_factor, height_scale_factor = self.qwen_vision_agent.query_qwen_vision_model(
+                qwen_query_future = self._api_executor.submit(
+                    self.qwen_vision_agent.query_qwen_vision_model,
                     screenshot_path, context_aware_prompt
                 )
-                
+
+            # Parse the UI hierarchy fallback while the API call is in flight
+            # (keyed by screen hash so repeated screens hit the parse cache)
+            parsed_ui_elements = self.ui_element_parser.parse_ui_hierarchy(
+                ui_hierarchy_path, cache_key=current_screen_hash
+            ) if ui_hierarchy_path else []
+
+            if cached_planned_action is not None:
+                action_to_execute = cached_planned_action
+                last_reused_screen_hash = current_screen_hash
+                self.execution_state.update_task_progress(action_to_execute)
+                print(f"Reusing cached action for repeated screen: {action_to_execute}")
+            elif qwen_query_future:
+                qwen_response, width_scale_factor, height_scale_factor = qwen_query_future.result()
+
                 if qwen_response:
                     # Parse and scale action coordinates
                     action_to_execute = self.qwen_vision_agent.extract_action_from_response(
@@ -110,17 +152,19 @@ class IntelligentMobileAgent:
                         self.execution_state.update_task_progress(action_to_execute)
                         print(f"Action Executed: {action_to_execute}")
             
-            # Secondary: Fallback to UI hierarchy analysis
-            if not action_to_execute and ui_hierarchy_path:
+            # Secondary: Fallback to UI hierarchy analysis (already parsed above)
+            if not action_to_execute and parsed_ui_elements:
                 print("Using UI hierarchy analysis as fallback")
-                parsed_ui_elements = self.ui_element_parser.parse_ui_hierarchy(ui_hierarchy_path)
-                
+
                 if not self.execution_state.search_initiated:
                     # Look for search-related elements
                     search_element_candidates = self.ui_element_parser.identify_search_elements(parsed_ui_elements)
                     if search_element_candidates:
                         best_search_element = search_element_candidates[0]
-                        action_to_execute = f"TAP ({best_search_element['center_x']},{best_search_element['center_y']}) # Search: {best_search_element['display_text'] or best_search_element['content_description']}"
+                        action_to_execute = _SEARCH_TAP_TEMPLATE.format(
+                            best_search_element['center_x'], best_search_element['center_y'],
+                            best_search_element['display_text'] or best_search_element['content_description']
+                        )
                         self.execution_state.search_initiated = True
                 
                 if not action_to_execute:
@@ -134,17 +178,22 @@ class IntelligentMobileAgent:
                 fallback_action_options = AppUtilities.get_predefined_fallback_actions()
                 action_to_execute = fallback_action_options[self.execution_state.current_step_number % len(fallback_action_options)]
                 print(f"Using predefined fallback: {action_to_execute}")
-            
+            elif current_screen_hash:
+                # Remember model/UI-analysis plans only; the blind rotation
+                # fallbacks are not screen-specific and not worth replaying
+                self._action_cache[current_screen_hash] = action_to_execute
+
             # Execute the determined action
             task_completion_achieved = self.action_coordinator.execute_parsed_action(action_to_execute)
             
             # Update execution progress
             self.execution_state.update_task_progress(action_to_execute)
             
-            # Check for explicit task completion
+            # Check for explicit task completion (literal prefix, no regex needed)
             if 'TASK_COMPLETE' in action_to_execute:
-                completion_match = re.search(r'TASK_COMPLETE:\s*(.+)', action_to_execute)
-                final_execution_result = completion_match.group(1) if completion_match else "Task completed successfully"
+                _, separator, completion_text = action_to_execute.partition('TASK_COMPLETE:')
+                completion_text = completion_text.strip()
+                final_execution_result = completion_text if separator and completion_text else "Task completed successfully"
                 break
         
         if not final_execution_result: